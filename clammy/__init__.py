@@ -1,55 +1,194 @@
+import os
 import socket
 import sys
 import struct
 import contextlib
-import re
+import queue
+import threading
 
 from clammy import exceptions
 
+try:
+    from clammy import _instream
+except ImportError:  # optional compiled accelerator, see _instream.pyx
+    _instream = None
+
+# MUST be <= StreamMaxLength in /etc/clamav/clamd.conf (default 25M)
+MAX_CHUNK_SIZE = 65536
+
+_PACK_LEN = struct.Struct("!L").pack
+
+# The INSTREAM terminator and the prefix of every full-sized chunk are
+# invariant, so pack them once instead of per chunk
+_INSTREAM_TERM = _PACK_LEN(0)
+_FULL_CHUNK_PREFIX = _PACK_LEN(MAX_CHUNK_SIZE)
+
+# Number of (length prefix, chunk) pairs coalesced into one sendmsg call
+_IOV_BATCH = 16
+
+# Maximum zSCAN commands in flight during an IDSESSION before scan_many
+# drains a response, so neither side can stall on a full send buffer
+_SESSION_WINDOW = 32
+
+# Prebuilt wire form of the fixed (argument-less) commands
+_CMD_CACHE = {
+    cmd: f"n{cmd}\n".encode("utf-8")
+    for cmd in ("PING", "VERSION", "RELOAD", "SHUTDOWN", "STATS", "INSTREAM")
+}
+
 
 class ClamAVDaemon:
     """
     Class for using clamd with a network socket
     """
 
-    def __init__(self, host="127.0.0.1", port=3310, unix_socket=None, timeout=None):
+    __slots__ = (
+        "host",
+        "port",
+        "unix_socket",
+        "timeout",
+        "pool_size",
+        "nodelay",
+        "sndbuf",
+        "rcvbuf",
+        "socket_type",
+        "_pool",
+        "_local",
+    )
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=3310,
+        unix_socket=None,
+        timeout=None,
+        pool_size=1,
+        nodelay=True,
+        sndbuf=None,
+        rcvbuf=None,
+    ):
         """
         Args:
             host (string): The hostname or IP address (if connecting to a network socket)
             port (int): TCP port (if connecting to a network socket)
             unix_socket (str):
             timeout (float or None) : socket timeout
+            pool_size (int): number of connections pre-warmed when entering the
+                context manager
+            nodelay (bool): disable Nagle's algorithm on TCP connections, which
+                otherwise delays the small chunked writes of INSTREAM
+            sndbuf (int or None): SO_SNDBUF size, or None for the system default
+            rcvbuf (int or None): SO_RCVBUF size, or None for the system default
         """
 
         self.host = host
         self.port = port
         self.unix_socket = unix_socket
         self.timeout = timeout
+        self.pool_size = pool_size
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self._pool = None
+        self._local = threading.local()
 
         if self.unix_socket:
             self.socket_type = socket.AF_UNIX
         else:
             self.socket_type = socket.AF_INET
 
-    def _init_socket(self):
+    def _connect(self):
 
         try:
-            self.clamd_socket = socket.socket(self.socket_type, socket.SOCK_STREAM)
+            # SOCK_CLOEXEC (absent on Windows) sets close-on-exec at
+            # creation, saving the separate fcntl call CPython would make.
+            sock = socket.socket(
+                self.socket_type,
+                socket.SOCK_STREAM | getattr(socket, "SOCK_CLOEXEC", 0),
+            )
+
+            # Buffer sizes must be set before connect so the TCP window
+            # scale is negotiated from them during the handshake.
+            if self.sndbuf is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+            if self.rcvbuf is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
 
             if self.socket_type == socket.AF_INET:
-                self.clamd_socket.connect((self.host, self.port))
+                sock.connect((self.host, self.port))
+                if self.nodelay:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             elif self.socket_type == socket.AF_UNIX:
-                self.clamd_socket.connect(self.unix_socket)
+                sock.connect(self.unix_socket)
 
-            self.clamd_socket.settimeout(self.timeout)
+            sock.settimeout(self.timeout)
+
+            return sock
 
         except socket.error:
             if self.socket_type == socket.AF_UNIX:
                 error_message = f'Error connecting to Unix socket "{self.unix_socket}"'
-            elif self.socket_Type == socket.AF_INET:
+            elif self.socket_type == socket.AF_INET:
                 error_message = f'Error connecting to network socket with host "{self.host}" and port "{self.port}"'
             raise exceptions.ConnectionError(error_message)
 
+    def _acquire(self):
+        """
+        Return a connection to clamd, taking a pre-warmed one from the
+        pool when available and connecting a new one otherwise.
+        """
+        if self._pool is None:
+            self._pool = queue.Queue()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """
+        Acquire a connection for the duration of a single command. clamd
+        closes its end of the connection after every command outside an
+        IDSESSION, so sockets are never reused afterwards: the pool only
+        holds pre-warmed connections that no command has touched yet.
+        """
+        sock = self._acquire()
+        try:
+            yield sock
+        finally:
+            sock.close()
+
+    def __enter__(self):
+        if self._pool is None:
+            self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+        return self
+
+    def __getstate__(self):
+        # The pool and the thread-local receive buffer hold sockets and
+        # per-thread state that cannot be pickled; both are recreated
+        # lazily, so they are simply dropped from copies.
+        return {
+            slot: getattr(self, slot)
+            for slot in self.__slots__
+            if slot not in ("_pool", "_local")
+        }
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._pool = None
+        self._local = threading.local()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
     def ping(self):
         return self._basic_command("PING")
 
@@ -68,12 +207,12 @@ class ClamAVDaemon:
         May raise:
           - ConnectionError: in case of communication problem
         """
+        sock = self._acquire()
         try:
-            self._init_socket()
-            self._send_command("SHUTDOWN")
-            # result = self._recv_response()
+            self._send_command(sock, "SHUTDOWN")
+            # result = self._recv_line(sock)
         finally:
-            self._close_socket()
+            sock.close()
 
     def scan(self, file):
         return self._file_system_scan("SCAN", file)
@@ -88,16 +227,13 @@ class ClamAVDaemon:
         """
         Send a command to the clamav server, and return the reply.
         """
-        self._init_socket()
-        try:
-            self._send_command(command)
-            response = self._recv_response().rsplit("ERROR", 1)
+        with self._connection() as sock:
+            self._send_command(sock, command)
+            response = self._recv_line(sock).rsplit("ERROR", 1)
             if len(response) > 1:
                 raise exceptions.ResponseError(response[0])
             else:
                 return response[0]
-        finally:
-            self._close_socket()
 
     def _file_system_scan(self, command, file):
         """
@@ -114,20 +250,83 @@ class ClamAVDaemon:
           - ConnectionError: in case of communication problem
         """
 
-        try:
-            self._init_socket()
-            self._send_command(command, file)
+        with self._connection() as sock:
+            self._send_command(sock, command, file)
 
-            dr = {}
-            for result in self._recv_response_multiline().split("\n"):
-                if result:
-                    filename, reason, status = self._parse_response(result)
-                    dr[filename] = (status, reason)
+            return {
+                filename: (status, reason)
+                for filename, reason, status in self._iter_parsed_responses(sock)
+            }
+
+    def _iter_parsed_responses(self, sock):
+        """
+        yield parsed (filename, reason, status) tuples from a scan
+        response, skipping malformed lines instead of aborting the scan
+        """
+        for line in self._iter_response_lines(sock):
+            if line:
+                try:
+                    yield self._parse_response(line)
+                except exceptions.ResponseError:
+                    continue
+
+    def scan_many(self, paths):
+        """
+        Scan many files over a single connection.
 
-            return dr
+        clamd only accepts multiple commands per connection inside an
+        IDSESSION, so the session is opened with zIDSESSION and paths are
+        pipelined as null-terminated zSCAN commands, keeping at most
+        _SESSION_WINDOW of them in flight and draining responses between
+        sends so neither side blocks on a full buffer. Results are
+        yielded as (filename, status, reason) tuples as they arrive, so
+        the caller can stream them.
 
+        paths (iterable of strings): filenames (MUST BE ABSOLUTE PATHS !)
+
+        May raise:
+          - ConnectionError: in case of communication problem
+        """
+
+        # The session socket is never reusable afterwards (clamd closes
+        # it at END), so connect directly instead of taking a pre-warmed
+        # socket from the pool.
+        sock = self._connect()
+        try:
+            sock.sendall(b"zIDSESSION\0")
+            responses = self._iter_null_delimited(sock)
+
+            in_flight = 0
+            for path in paths:
+                sock.sendall(f"zSCAN {path}\0".encode("utf-8"))
+                in_flight += 1
+                if in_flight >= _SESSION_WINDOW:
+                    yield self._next_session_result(responses)
+                    in_flight -= 1
+
+            sock.sendall(b"zEND\0")
+            while in_flight:
+                yield self._next_session_result(responses)
+                in_flight -= 1
         finally:
-            self._close_socket()
+            sock.close()
+
+    def _next_session_result(self, responses):
+        """
+        read and parse one IDSESSION response, stripping the
+        "<request id>: " tag clamd prefixes inside a session
+        """
+        try:
+            response = next(responses)
+        except StopIteration:
+            raise exceptions.ConnectionError(
+                "Connection closed by clamd before all scan responses were received"
+            )
+        request_id, sep, result = response.partition(": ")
+        if not sep or not request_id.isdigit():
+            result = response
+        filename, reason, status = self._parse_response(result)
+        return filename, status, reason
 
     def instream(self, buff):
         """
@@ -143,21 +342,71 @@ class ClamAVDaemon:
           - ConnectionError: in case of communication problem
         """
 
-        try:
-            self._init_socket()
-            self._send_command("INSTREAM")
-
-            max_chunk_size = 1024  # MUST be < StreamMaxLength in /etc/clamav/clamd.conf
-
-            chunk = buff.read(max_chunk_size)
-            while chunk:
-                size = struct.pack(b"!L", len(chunk))
-                self.clamd_socket.send(size + chunk)
-                chunk = buff.read(max_chunk_size)
-
-            self.clamd_socket.send(struct.pack(b"!L", 0))
-
-            result = self._recv_response()
+        with self._connection() as sock:
+            self._send_command(sock, "INSTREAM")
+
+            try:
+                in_fd = buff.fileno()
+                # The fd offset may sit ahead of the logical position due
+                # to buffered read-ahead, so trust the file object.
+                offset = buff.tell()
+                size = os.fstat(in_fd).st_size - offset
+            except (OSError, AttributeError):
+                in_fd = None
+
+            # Raw sendfile bypasses the socket layer's timeout handling
+            # (the fd is non-blocking when a timeout is set), so only
+            # take this path on blocking sockets.
+            if in_fd is not None and hasattr(os, "sendfile") and sock.gettimeout() is None:
+                # Real file: keep the data in the kernel with sendfile
+                # instead of copying it through userspace.
+                out_fd = sock.fileno()
+                while size > 0:
+                    stride = min(size, MAX_CHUNK_SIZE)
+                    sock.sendall(
+                        _FULL_CHUNK_PREFIX
+                        if stride == MAX_CHUNK_SIZE
+                        else _PACK_LEN(stride)
+                    )
+                    sent = 0
+                    while sent < stride:
+                        n = os.sendfile(out_fd, in_fd, offset + sent, stride - sent)
+                        if n == 0:
+                            # The stride-byte length prefix is already on
+                            # the wire, so a shrunken file cannot be
+                            # papered over without corrupting the stream.
+                            raise exceptions.ConnectionError(
+                                f"Unexpected end of file while streaming {stride} byte chunk"
+                            )
+                        sent += n
+                    offset += stride
+                    size -= stride
+                sock.sendall(_INSTREAM_TERM)
+            elif _instream is not None and sock.gettimeout() is None and hasattr(buff, "readinto"):
+                # Compiled accelerator: sends the chunk framing with
+                # writev while the GIL is released. Like sendfile above,
+                # the raw-fd writes would not honor a socket timeout, so
+                # it is only used on blocking sockets.
+                _instream.send_stream(sock.fileno(), buff, MAX_CHUNK_SIZE)
+            else:
+                iov = []
+                chunk = buff.read(MAX_CHUNK_SIZE)
+                while chunk:
+                    iov.append(
+                        _FULL_CHUNK_PREFIX
+                        if len(chunk) == MAX_CHUNK_SIZE
+                        else _PACK_LEN(len(chunk))
+                    )
+                    iov.append(chunk)
+                    if len(iov) >= 2 * _IOV_BATCH:
+                        self._send_iov(sock, iov)
+                        iov.clear()
+                    chunk = buff.read(MAX_CHUNK_SIZE)
+
+                iov.append(_INSTREAM_TERM)
+                self._send_iov(sock, iov)
+
+            result = self._recv_line(sock)
 
             if len(result) > 0:
                 if result == "INSTREAM size limit exceeded. ERROR":
@@ -165,8 +414,6 @@ class ClamAVDaemon:
 
                 filename, reason, status = self._parse_response(result)
                 return {filename: (status, reason)}
-        finally:
-            self._close_socket()
 
     def stats(self):
         """
@@ -177,67 +424,139 @@ class ClamAVDaemon:
         May raise:
           - ConnectionError: in case of communication problem
         """
-        self._init_socket()
-        try:
-            self._send_command("STATS")
-            return self._recv_response_multiline()
-        finally:
-            self._close_socket()
+        with self._connection() as sock:
+            self._send_command(sock, "STATS")
+            return self._recv_response_multiline(sock)
 
-    def _send_command(self, cmd, *args):
+    def _send_command(self, sock, cmd, *args):
         """
         `man clamd` recommends to prefix commands with z, but we will use \n
         terminated strings, as python<->clamd has some problems with \0x00
         """
-        concat_args = ""
-        if args:
+        if not args:
+            cmd = _CMD_CACHE.get(cmd) or f"n{cmd}\n".encode("utf-8")
+        else:
             concat_args = " " + " ".join(args)
+            cmd = f"n{cmd}{concat_args}\n".encode("utf-8")
+        sock.sendall(cmd)
 
-        # cmd = 'n{cmd}{args}\n'.format(cmd=cmd, args=concat_args).encode('utf-8')
-        cmd = f"n{cmd}{concat_args}\n".encode("utf-8")
-        self.clamd_socket.send(cmd)
+    def _send_iov(self, sock, iov):
+        """
+        Send a sequence of buffers with a single scatter-gather syscall
+        (writev) where the platform supports it, retrying short writes.
+        """
+        if not hasattr(sock, "sendmsg"):
+            sock.sendall(b"".join(iov))
+            return
+
+        while iov:
+            sent = sock.sendmsg(iov)
+            rest = []
+            for buf in iov:
+                if sent >= len(buf):
+                    sent -= len(buf)
+                elif sent:
+                    rest.append(memoryview(buf)[sent:])
+                    sent = 0
+                else:
+                    rest.append(buf)
+            iov = rest
+
+    def _recv_line(self, sock):
+        """
+        receive a single line from clamd into a reusable per-thread
+        receive buffer, avoiding a fresh BufferedReader per command
+        """
+        try:
+            buf = self._local.rxbuf
+        except AttributeError:
+            buf = self._local.rxbuf = bytearray(8192)
+        used = 0
+        try:
+            while True:
+                if used == len(buf):
+                    buf.extend(b"\x00" * len(buf))
+                n = sock.recv_into(memoryview(buf)[used:])
+                if n == 0:
+                    break
+                idx = buf.find(b"\n", used, used + n)
+                used += n
+                if idx != -1:
+                    return bytes(buf[:idx]).decode("utf-8").strip()
+            if not used:
+                raise exceptions.ConnectionError(
+                    "Connection closed by clamd before a reply was received"
+                )
+            return bytes(buf[:used]).decode("utf-8").strip()
+        except (socket.error, socket.timeout):
+            e = sys.exc_info()[1]
+            raise exceptions.ConnectionError(
+                f"Error while reading from socket: {e.args}"
+            )
 
-    def _recv_response(self):
+    def _iter_response_lines(self, sock):
         """
-        receive line from clamd
+        receive a multiline response from clamd, yielding one decoded line
+        at a time so the caller can parse while the server is still sending
         """
         try:
-            with contextlib.closing(self.clamd_socket.makefile("rb")) as f:
-                return f.readline().decode("utf-8").strip()
+            with contextlib.closing(sock.makefile("rb", buffering=65536)) as f:
+                for line in f:
+                    yield line.decode("utf-8").rstrip("\n")
         except (socket.error, socket.timeout):
             e = sys.exc_info()[1]
-            raise ConnectionError(f"Error while reading from socket: {e.args}")
+            raise exceptions.ConnectionError(
+                f"Error while reading from socket: {e.args}"
+            )
 
-    def _recv_response_multiline(self):
+    def _iter_null_delimited(self, sock):
         """
-        receive multiple line response from clamd and strip all whitespace characters
+        yield decoded null-terminated responses from a z-command session
+        until the server closes the connection
         """
+        buf = b""
         try:
-            with contextlib.closing(self.clamd_socket.makefile("rb")) as f:
-                return f.read().decode("utf-8")
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+                while True:
+                    response, sep, buf = buf.partition(b"\0")
+                    if not sep:
+                        buf = response
+                        break
+                    yield response.decode("utf-8")
         except (socket.error, socket.timeout):
             e = sys.exc_info()[1]
             raise exceptions.ConnectionError(
                 f"Error while reading from socket: {e.args}"
             )
 
-    def _close_socket(self):
+    def _recv_response_multiline(self, sock):
         """
-        close clamd socket
+        receive multiple line response from clamd as a single string
         """
-        self.clamd_socket.close()
-        return
+        return "\n".join(self._iter_response_lines(sock))
 
-    def _parse_response(self, msg):
+    @staticmethod
+    def _parse_response(msg):
         """
         parses responses for SCAN, CONTSCAN, MULTISCAN and STREAM commands.
-        """
 
-        scan_response = re.compile(
-            r"^(?P<path>.*): ((?P<virus>.+) )?(?P<status>(FOUND|OK|ERROR))$"
-        )
+        Responses are "PATH: OK", "PATH: VIRUS FOUND" or
+        "PATH[: REASON]: ERROR", so plain string splitting is enough and
+        avoids running a backtracking regex per result line.
+        """
 
-        try:
-            return scan_response.match(msg).group("path", "virus", "status")
-        except AttributeError:
-            raise exceptions.ResponseError(msg.rsplit("ERROR", 1)[0])
+        path, sep, result = msg.rpartition(": ")
+        if sep:
+            if result == "OK":
+                return path, None, "OK"
+            if result.endswith(" FOUND"):
+                return path, result[: -len(" FOUND")], "FOUND"
+            if result == "ERROR":
+                return path, None, "ERROR"
+            if result.endswith(" ERROR"):
+                return path, result[: -len(" ERROR")], "ERROR"
+        raise exceptions.ResponseError(msg.rsplit("ERROR", 1)[0])
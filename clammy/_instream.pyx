@@ -0,0 +1,84 @@
+# cython: language_level=3
+"""
+Optional C accelerator for the INSTREAM chunking loop.
+
+Sends the size-prefixed chunk framing with writev while the GIL is
+released, so other threads keep running during the socket writes. The
+extension is not built by default; compile it with cythonize and clammy
+will pick it up, falling back to the pure-Python loop otherwise.
+"""
+
+from cpython.bytearray cimport PyByteArray_AS_STRING
+
+from libc.errno cimport EINTR, errno
+from libc.stdint cimport uint32_t
+from libc.string cimport memcpy, strerror
+
+cdef extern from "arpa/inet.h" nogil:
+    uint32_t htonl(uint32_t)
+
+cdef extern from "sys/uio.h" nogil:
+    struct iovec:
+        void *iov_base
+        size_t iov_len
+    ssize_t writev(int fd, const iovec *iov, int iovcnt)
+
+
+cdef int _send_chunk(int fd, unsigned char *prefix, unsigned char *data,
+                     size_t length) nogil:
+    cdef iovec iov[2]
+    cdef ssize_t n
+    cdef size_t skip = 0
+    cdef size_t total = 4 + length
+
+    while skip < total:
+        if skip < 4:
+            iov[0].iov_base = prefix + skip
+            iov[0].iov_len = 4 - skip
+            iov[1].iov_base = data
+            iov[1].iov_len = length
+            n = writev(fd, iov, 2)
+        else:
+            iov[0].iov_base = data + (skip - 4)
+            iov[0].iov_len = length - (skip - 4)
+            n = writev(fd, iov, 1)
+        if n < 0:
+            if errno == EINTR:
+                continue
+            return -1
+        skip += <size_t>n
+    return 0
+
+
+cpdef send_stream(int fd, object buff, int chunk_size):
+    """
+    Send the INSTREAM chunk framing for buff (which must support
+    readinto) over the connected socket fd, terminator included.
+    """
+    cdef bytearray chunk = bytearray(chunk_size)
+    cdef unsigned char *data = <unsigned char *>PyByteArray_AS_STRING(chunk)
+    cdef unsigned char prefix[4]
+    cdef uint32_t be
+    cdef Py_ssize_t n
+    cdef int rc
+
+    readinto = buff.readinto
+    view = memoryview(chunk)
+
+    while True:
+        n = readinto(view)
+        if not n:
+            break
+        be = htonl(<uint32_t>n)
+        memcpy(prefix, &be, 4)
+        with nogil:
+            rc = _send_chunk(fd, prefix, data, <size_t>n)
+        if rc < 0:
+            raise OSError(errno, strerror(errno).decode("utf-8"))
+
+    be = 0
+    memcpy(prefix, &be, 4)
+    with nogil:
+        rc = _send_chunk(fd, prefix, data, 0)
+    if rc < 0:
+        raise OSError(errno, strerror(errno).decode("utf-8"))
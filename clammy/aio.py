@@ -0,0 +1,203 @@
+import asyncio
+
+from clammy import (
+    MAX_CHUNK_SIZE,
+    _INSTREAM_TERM,
+    _PACK_LEN,
+    ClamAVDaemon,
+    exceptions,
+)
+
+# Write-buffer size above which instream pauses to let the transport drain
+_HIGH_WATER = 1 << 20
+
+
+class AsyncClamAVDaemon:
+    """
+    asyncio variant of ClamAVDaemon
+
+    Each command opens its own connection, so a single thread can keep
+    many scans in flight concurrently (up to clamd's MaxThreads).
+    """
+
+    __slots__ = ("host", "port", "unix_socket", "timeout")
+
+    def __init__(self, host="127.0.0.1", port=3310, unix_socket=None, timeout=None):
+        """
+        Args:
+            host (string): The hostname or IP address (if connecting to a network socket)
+            port (int): TCP port (if connecting to a network socket)
+            unix_socket (str):
+            timeout (float or None) : connect timeout in seconds
+        """
+
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    _parse_response = staticmethod(ClamAVDaemon._parse_response)
+
+    async def _connect(self):
+        try:
+            if self.unix_socket:
+                connection = asyncio.open_unix_connection(self.unix_socket)
+            else:
+                connection = asyncio.open_connection(self.host, self.port)
+            return await asyncio.wait_for(connection, self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            if self.unix_socket:
+                error_message = f'Error connecting to Unix socket "{self.unix_socket}"'
+            else:
+                error_message = f'Error connecting to network socket with host "{self.host}" and port "{self.port}"'
+            raise exceptions.ConnectionError(error_message)
+
+    async def ping(self):
+        return await self._basic_command("PING")
+
+    async def version(self):
+        return await self._basic_command("VERSION")
+
+    async def reload(self):
+        return await self._basic_command("RELOAD")
+
+    async def shutdown(self):
+        """
+        Force Clamd to shutdown and exit
+
+        return: nothing
+
+        May raise:
+          - ConnectionError: in case of communication problem
+        """
+        reader, writer = await self._connect()
+        try:
+            writer.write(b"nSHUTDOWN\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def scan(self, file):
+        return await self._file_system_scan("SCAN", file)
+
+    async def contscan(self, file):
+        return await self._file_system_scan("CONTSCAN", file)
+
+    async def multiscan(self, file):
+        return await self._file_system_scan("MULTISCAN", file)
+
+    async def _basic_command(self, command):
+        """
+        Send a command to the clamav server, and return the reply.
+        """
+        reader, writer = await self._connect()
+        try:
+            writer.write(f"n{command}\n".encode("utf-8"))
+            await writer.drain()
+            raw = await reader.readline()
+            if not raw:
+                raise exceptions.ConnectionError(
+                    "Connection closed by clamd before a reply was received"
+                )
+            line = raw.decode("utf-8").strip()
+        finally:
+            writer.close()
+
+        response = line.rsplit("ERROR", 1)
+        if len(response) > 1:
+            raise exceptions.ResponseError(response[0])
+        else:
+            return response[0]
+
+    async def _file_system_scan(self, command, file):
+        """
+        Scan a file or directory given by filename using multiple threads (faster on SMP machines).
+        Do not stop on error or virus found.
+        Scan with archive support enabled.
+
+        file (string): filename or directory (MUST BE ABSOLUTE PATH !)
+
+        return:
+          - (dict): {filename1: ('FOUND', 'virusname'), filename2: ('ERROR', 'reason')}
+
+        May raise:
+          - ConnectionError: in case of communication problem
+        """
+
+        reader, writer = await self._connect()
+        try:
+            writer.write(f"n{command} {file}\n".encode("utf-8"))
+            await writer.drain()
+
+            dr = {}
+            while True:
+                line = (await reader.readline()).decode("utf-8").rstrip("\n")
+                if not line:
+                    break
+                filename, reason, status = self._parse_response(line)
+                dr[filename] = (status, reason)
+
+            return dr
+        finally:
+            writer.close()
+
+    async def instream(self, buff):
+        """
+        Scan a buffer
+
+        buff  filelikeobj: buffer to scan
+
+        return:
+          - (dict): {filename1: ("virusname", "status")}
+
+        May raise :
+          - BufferTooLongError: if the buffer size exceeds clamd limits
+          - ConnectionError: in case of communication problem
+        """
+
+        reader, writer = await self._connect()
+        try:
+            writer.write(b"nINSTREAM\n")
+
+            chunk = buff.read(MAX_CHUNK_SIZE)
+            while chunk:
+                writer.write(_PACK_LEN(len(chunk)) + chunk)
+                if writer.transport.get_write_buffer_size() > _HIGH_WATER:
+                    await writer.drain()
+                chunk = buff.read(MAX_CHUNK_SIZE)
+
+            writer.write(_INSTREAM_TERM)
+            await writer.drain()
+
+            raw = await reader.readline()
+            if not raw:
+                raise exceptions.ConnectionError(
+                    "Connection closed by clamd before a reply was received"
+                )
+            result = raw.decode("utf-8").strip()
+        finally:
+            writer.close()
+
+        if len(result) > 0:
+            if result == "INSTREAM size limit exceeded. ERROR":
+                raise exceptions.BufferTooLongError(result)
+
+            filename, reason, status = self._parse_response(result)
+            return {filename: (status, reason)}
+
+    async def stats(self):
+        """
+        Get Clamscan stats
+
+        return: (string) clamscan stats
+
+        May raise:
+          - ConnectionError: in case of communication problem
+        """
+        reader, writer = await self._connect()
+        try:
+            writer.write(b"nSTATS\n")
+            await writer.drain()
+            return (await reader.read()).decode("utf-8")
+        finally:
+            writer.close()
@@ -1,6 +1,12 @@
+import asyncio
+import os
+import socket
+import struct
+import threading
 from io import BytesIO
 
 from clammy import ClamAVDaemon, exceptions
+from clammy.aio import AsyncClamAVDaemon
 
 import pytest
 
@@ -13,6 +19,11 @@ def clamav_daemon():
     return ClamAVDaemon(unix_socket="/var/run/clamav/clamd.ctl")
 
 
+@pytest.fixture()
+def async_clamav_daemon():
+    return AsyncClamAVDaemon(unix_socket="/var/run/clamav/clamd.ctl")
+
+
 def test_ping(clamav_daemon):
     assert clamav_daemon.ping() == "PONG"
 
@@ -22,6 +33,33 @@ def test_cannot_connect():
         ClamAVDaemon(unix_socket="/tmp/404").ping()
 
 
+def test_cannot_connect_network():
+    with pytest.raises(exceptions.ConnectionError):
+        ClamAVDaemon(host="127.0.0.1", port=1, timeout=1).ping()
+
+
+class ShortWriteSocket:
+    """Fake socket whose scatter-gather sends accept at most a few bytes,
+    as a saturated send buffer would."""
+
+    def __init__(self):
+        self.sent = b""
+
+    def sendmsg(self, buffers):
+        data = b"".join(bytes(b) for b in buffers)[:3]
+        self.sent += data
+        return len(data)
+
+    def sendall(self, data):
+        self.sent += bytes(data)
+
+
+def test_send_iov_retries_short_writes():
+    sock = ShortWriteSocket()
+    ClamAVDaemon()._send_iov(sock, [b"\x00\x00\x00\x05", b"hello", b"\x00\x00\x00\x00"])
+    assert sock.sent == b"\x00\x00\x00\x05hello\x00\x00\x00\x00"
+
+
 def test_version(clamav_daemon):
     assert clamav_daemon.version().startswith("ClamAV")
 
@@ -52,3 +90,118 @@ def test_instream(clamav_daemon):
     assert clamav_daemon.instream(BytesIO(EICAR.encode("utf-8"))) == {
         "stream": ("FOUND", "winnow.malware.test.eicar.com.UNOFFICIAL")
     }
+
+
+def test_scan_many(clamav_daemon, tmpdir):
+    clean = tmpdir.join("clean.txt")
+    clean.write("nothing to see here")
+    infected = tmpdir.join("eicar.txt")
+    infected.write(EICAR)
+
+    results = {
+        filename: (status, reason)
+        for filename, status, reason in clamav_daemon.scan_many(
+            [str(clean), str(infected)]
+        )
+    }
+    assert results == {
+        str(clean): ("OK", None),
+        str(infected): ("FOUND", "winnow.malware.test.eicar.com.UNOFFICIAL"),
+    }
+
+
+def test_next_session_result_strips_tag():
+    responses = iter(["1: /tmp/eicar.txt: Eicar-Test-Signature FOUND"])
+    assert ClamAVDaemon()._next_session_result(responses) == (
+        "/tmp/eicar.txt",
+        "FOUND",
+        "Eicar-Test-Signature",
+    )
+
+
+def test_next_session_result_connection_closed():
+    with pytest.raises(exceptions.ConnectionError):
+        ClamAVDaemon()._next_session_result(iter([]))
+
+
+def test_async_ping(async_clamav_daemon):
+    assert asyncio.run(async_clamav_daemon.ping()) == "PONG"
+
+
+def test_async_cannot_connect():
+    with pytest.raises(exceptions.ConnectionError):
+        asyncio.run(AsyncClamAVDaemon(unix_socket="/tmp/404").ping())
+
+
+def test_async_version(async_clamav_daemon):
+    assert asyncio.run(async_clamav_daemon.version()).startswith("ClamAV")
+
+
+def test_async_scan(async_clamav_daemon, tmpdir):
+    p = tmpdir.join("eicar.txt")
+    p.write(EICAR)
+
+    assert asyncio.run(async_clamav_daemon.scan(str(p))) == {
+        str(p): ("FOUND", "winnow.malware.test.eicar.com.UNOFFICIAL")
+    }
+
+
+def test_async_instream(async_clamav_daemon):
+    assert asyncio.run(
+        async_clamav_daemon.instream(BytesIO(EICAR.encode("utf-8")))
+    ) == {"stream": ("FOUND", "winnow.malware.test.eicar.com.UNOFFICIAL")}
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        (
+            "/tmp/eicar.txt: Eicar-Test-Signature FOUND",
+            ("/tmp/eicar.txt", "Eicar-Test-Signature", "FOUND"),
+        ),
+        ("/tmp/clean.txt: OK", ("/tmp/clean.txt", None, "OK")),
+        ("/tmp/denied.txt: ERROR", ("/tmp/denied.txt", None, "ERROR")),
+        (
+            "/tmp/gone.txt: lstat() failed: No such file or directory. ERROR",
+            ("/tmp/gone.txt: lstat() failed", "No such file or directory.", "ERROR"),
+        ),
+        ("stream: Win.Test.EICAR_HDB-1 FOUND", ("stream", "Win.Test.EICAR_HDB-1", "FOUND")),
+    ],
+)
+def test_parse_response(line, expected):
+    assert ClamAVDaemon()._parse_response(line) == expected
+
+
+def test_parse_response_malformed():
+    with pytest.raises(exceptions.ResponseError):
+        ClamAVDaemon()._parse_response("not a clamd response")
+
+
+def test_instream_accelerator_send_stream():
+    _instream = pytest.importorskip("clammy._instream")
+
+    a, b = socket.socketpair()
+    received = bytearray()
+
+    def read_frames():
+        while True:
+            header = b""
+            while len(header) < 4:
+                header += b.recv(4 - len(header))
+            (length,) = struct.unpack("!L", header)
+            if length == 0:
+                return
+            while length:
+                data = b.recv(length)
+                received.extend(data)
+                length -= len(data)
+
+    reader = threading.Thread(target=read_frames)
+    reader.start()
+    payload = os.urandom(65536 * 2 + 999)
+    _instream.send_stream(a.fileno(), BytesIO(payload), 65536)
+    reader.join()
+    a.close()
+    b.close()
+
+    assert bytes(received) == payload